@@ -1,67 +1,103 @@
 import asyncio
 import logging
 import ssl
-import sys
+from functools import lru_cache
 
-from scrapy.http import Headers
 from aioscrapy.https import TextResponse
 import aiohttp
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=32)
+def _build_ssl_ctx(ciphers):
+    """按加密套件缓存SSLContext, 避免每个请求都重新加载证书"""
+    context = ssl.create_default_context()
+    context.set_ciphers(ciphers)
+    return context
+
+
 class AioHttpDownloadHandler:
     session = None
+    proxy_session = None
 
     def __init__(self, settings):
         self.settings = settings
         self.aiohttp_client_session_args = settings.get('AIOHTTP_CLIENT_SESSION_ARGS', {})
         self.verify_ssl = self.settings.get("VERIFY_SSL")
-        if sys.platform.startswith('win'):
-            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        self.timeout = aiohttp.ClientTimeout(total=settings.getfloat('DOWNLOAD_TIMEOUT') or None)
+        self.default_headers = settings.getdict('DEFAULT_REQUEST_HEADERS')
+        self._connector = None
+        self._connector_kwargs = dict(
+            limit=settings.getint('CONCURRENT_REQUESTS', 100) * 2,
+            # 单个域名/ip的并发由下载器的slot控制, 这里不再限制
+            limit_per_host=0,
+            ttl_dns_cache=300,
+            use_dns_cache=True,
+            enable_cleanup_closed=True,
+        )
+        # 使用aiodns异步解析域名, 避免getaddrinfo阻塞
+        self.use_async_resolver = settings.getbool('AIOHTTP_ASYNC_RESOLVER', False)
 
     @classmethod
     def from_settings(cls, settings):
         return cls(settings)
 
+    def _new_session(self, *args, **kwargs):
+        if 'connector' not in kwargs:
+            if self._connector is None:
+                connector_kwargs = dict(self._connector_kwargs)
+                if self.use_async_resolver:
+                    connector_kwargs['resolver'] = aiohttp.AsyncResolver()
+                self._connector = aiohttp.TCPConnector(**connector_kwargs)
+            # 普通请求和代理请求的session共用一个连接池, 由close()统一关闭
+            kwargs['connector'] = self._connector
+            kwargs['connector_owner'] = False
+        return aiohttp.ClientSession(*args, **kwargs)
+
     def get_session(self, *args, **kwargs):
         if self.session is None:
-            self.session = aiohttp.ClientSession(*args, **kwargs)
+            self.session = self._new_session(*args, **kwargs)
         return self.session
 
+    def get_proxy_session(self, *args, **kwargs):
+        """代理请求的session不保存cookie, 避免响应的cookie被带到其他代理或不走代理的请求上"""
+        if self.proxy_session is None:
+            kwargs['cookie_jar'] = aiohttp.DummyCookieJar()
+            self.proxy_session = self._new_session(*args, **kwargs)
+        return self.proxy_session
+
     async def download_request(self, request, spider):
         kwargs = {
             'verify_ssl': request.meta.get('verify_ssl', self.verify_ssl),
-            'timeout': self.settings.get('DOWNLOAD_TIMEOUT'),
-            'cookies': dict(request.cookies),
-            'data': request.body or None
+            'timeout': self.timeout,
         }
+        # 只传入有值的参数, 避免每个请求都创建空的dict
+        if request.cookies:
+            kwargs['cookies'] = dict(request.cookies)
+        if request.body:
+            kwargs['data'] = request.body
 
-        headers = request.headers or self.settings.get('DEFAULT_REQUEST_HEADERS')
-        if isinstance(headers, Headers):
-            headers = headers.to_unicode_dict()
-        kwargs['headers'] = headers
+        if request.headers:
+            kwargs['headers'] = request.headers.to_unicode_dict()
+        elif self.default_headers:
+            kwargs['headers'] = self.default_headers
 
         ssl_ciphers = request.meta.get('TLS_CIPHERS')
         if ssl_ciphers:
-            context = ssl.create_default_context()
-            context.set_ciphers(ssl_ciphers)
-            kwargs['ssl'] = context
+            kwargs['ssl'] = _build_ssl_ctx(ssl_ciphers)
 
+        # 所有代理共用一个session, aiohttp的连接池会按代理区分连接
         proxy = request.meta.get("proxy")
         if proxy:
             kwargs["proxy"] = proxy
             logger.info(f"使用代理{proxy}抓取: {request.url}")
-
-            async with aiohttp.ClientSession(**self.aiohttp_client_session_args) as session:
-                async with session.request(request.method, request.url, **kwargs) as response:
-                    content = await response.read()
-
-        # 当不用代理的时候，session不关闭
+            session = self.get_proxy_session(**self.aiohttp_client_session_args)
         else:
             session = self.get_session(**self.aiohttp_client_session_args)
-            async with session.request(request.method, request.url, **kwargs) as response:
-                content = await response.read()
+
+        async with session.request(request.method, request.url, **kwargs) as response:
+            content = await response.read()
 
         return TextResponse(str(response.url),
                             status=response.status,
@@ -72,6 +108,10 @@ class AioHttpDownloadHandler:
     async def close(self):
         if self.session is not None:
             await self.session.close()
+        if self.proxy_session is not None:
+            await self.proxy_session.close()
+        if self._connector is not None:
+            await self._connector.close()
 
         # Wait 250 ms for the underlying SSL connections to close
         # https://docs.aiohttp.org/en/latest/client_advanced.html#graceful-shutdown
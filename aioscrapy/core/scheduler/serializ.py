@@ -1,7 +1,10 @@
 import pickle
 import json
 
-from scrapy.utils.python import to_unicode
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 __all__ = ['PickleCompat', 'JsonCompat']
@@ -9,13 +12,12 @@ __all__ = ['PickleCompat', 'JsonCompat']
 
 def _request_byte2str(obj):
     _encoding = obj.get('_encoding', 'utf-8')
-    obj.update({
-        'body': obj['body'].decode(_encoding),
-        'headers': {
-            to_unicode(k, encoding=_encoding): to_unicode(b','.join(v), encoding=_encoding)
-            for k, v in obj['headers'].items()
-        }
-    })
+    join = b','.join
+    obj['body'] = obj['body'].decode(_encoding)
+    obj['headers'] = {
+        k.decode(_encoding): join(v).decode(_encoding)
+        for k, v in obj['headers'].items()
+    }
     return obj
 
 
@@ -32,8 +34,17 @@ class PickleCompat:
 class JsonCompat:
     @staticmethod
     def loads(s):
+        # 不使用orjson.loads: 超过64位的整数会被解析成float, 且不支持NaN/Infinity
         return json.loads(s)
 
     @staticmethod
     def dumps(obj):
-        return json.dumps(_request_byte2str(obj))
+        obj = _request_byte2str(obj)
+        if orjson is not None:
+            try:
+                # 非str类型的key与json.dumps行为保持一致, 转成str
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            except orjson.JSONEncodeError:
+                # 超过64位的整数等orjson不支持的数据, 交给json处理
+                pass
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
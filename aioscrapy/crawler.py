@@ -4,6 +4,7 @@ import warnings
 import asyncio
 import signal
 import sys
+from functools import partial
 
 from zope.interface.exceptions import DoesNotImplement
 
@@ -36,6 +37,28 @@ from aioscrapy.utils.ossignal import install_shutdown_handlers, signal_names
 logger = logging.getLogger(__name__)
 
 
+def _install_fast_loop():
+    """安装事件循环策略: 非windows优先uvloop, windows优先winloop, 否则使用SelectorEventLoop"""
+    if sys.platform.startswith('win'):
+        try:
+            import winloop
+            asyncio.set_event_loop_policy(winloop.EventLoopPolicy())
+        except ImportError:
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    else:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+
+
+def _crawler_done(runner, crawler, task):
+    runner.crawlers.discard(crawler)
+    runner._active.discard(task)
+    runner.bootstrap_failed |= not getattr(crawler, 'spider', None)
+
+
 class Crawler:
 
     def __init__(self, spidercls, *args, settings=None, **kwargs):
@@ -134,6 +157,7 @@ class CrawlerRunner:
         self.spider_loader = self._get_spider_loader(settings)
         self._crawlers = set()
         self._active = set()
+        self._task_group = None
         self.bootstrap_failed = False
 
     @property
@@ -157,16 +181,12 @@ class CrawlerRunner:
         self.active_crawler(crawler)
 
     def active_crawler(self, crawler):
-        task = asyncio.create_task(crawler.crawl())
+        if self._task_group is not None:
+            task = self._task_group.create_task(crawler.crawl())
+        else:
+            task = asyncio.create_task(crawler.crawl())
         self._active.add(task)
-
-        def _done(result):
-            self.crawlers.discard(crawler)
-            self._active.discard(task)
-            self.bootstrap_failed |= not getattr(crawler, 'spider', None)
-            return result
-
-        task.add_done_callback(_done)
+        task.add_done_callback(partial(_crawler_done, self, crawler))
 
     def create_crawler(self, crawler_or_spidercls, *args, **kwargs):
         if isinstance(crawler_or_spidercls, Spider):
@@ -190,6 +210,7 @@ class CrawlerRunner:
 class CrawlerProcess(CrawlerRunner):
 
     def __init__(self, settings=None, install_root_handler=True):
+        _install_fast_loop()
         super().__init__(settings)
         install_shutdown_handlers(self._signal_shutdown)
         configure_logging(self.settings, install_root_handler)
@@ -209,19 +230,26 @@ class CrawlerProcess(CrawlerRunner):
         asyncio.create_task(self._stop_reactor())
 
     async def run(self):
-        for crawler in self.crawlers:
-            self.active_crawler(crawler)
-        while self._active:
-            await asyncio.gather(*self._active)
+        if hasattr(asyncio, 'TaskGroup'):
+            # python3.11+: crawl_soon追加的爬虫也放到同一个TaskGroup中等待
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    self._task_group = tg
+                    for crawler in list(self.crawlers):
+                        self.active_crawler(crawler)
+            except BaseExceptionGroup as eg:
+                # 与gather的行为保持一致, 抛出爬虫自身的异常而不是ExceptionGroup
+                raise eg.exceptions[0]
+            finally:
+                self._task_group = None
+        else:
+            for crawler in list(self.crawlers):
+                self.active_crawler(crawler)
+            while self._active:
+                await asyncio.gather(*self._active)
         await self.recycle_db_connect()
 
     def start(self):
-        if not sys.platform.startswith('win'):
-            try:
-                import uvloop
-                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-            except ImportError:
-                pass
         asyncio.run(self.run())
 
     async def _graceful_stop_reactor(self):
@@ -1,4 +1,5 @@
 import logging
+from asyncio import iscoroutinefunction
 
 from scrapy.utils.conf import build_component_list
 
@@ -11,6 +12,10 @@ logger = logging.getLogger(__name__)
 class ItemPipelineManager(MiddlewareManager):
     component_name = 'item pipeline'
 
+    def __init__(self, *middlewares):
+        super().__init__(*middlewares)
+        self._compiled_process_item = self._compile_chain(self.methods['process_item'])
+
     @classmethod
     def _get_mwlist_from_settings(cls, settings):
         return build_component_list(settings.getwithbase('ITEM_PIPELINES'))
@@ -20,5 +25,22 @@ class ItemPipelineManager(MiddlewareManager):
         if hasattr(pipe, 'process_item'):
             self.methods['process_item'].append(pipe.process_item)
 
+    @staticmethod
+    def _compile_chain(callbacks):
+        """把process_item调用链生成一个协程函数, 与process_chain的行为一致, 省去每个item的循环和判断"""
+        namespace = {}
+        lines = ['async def _chain(item, spider):']
+        for index, callback in enumerate(callbacks):
+            namespace[f'm{index}'] = callback
+            call = f'm{index}(item, spider)'
+            if iscoroutinefunction(callback):
+                call = f'await {call}'
+            lines.append(f'    result = {call}')
+            lines.append('    if result is not None:')
+            lines.append('        item = result')
+        lines.append('    return item')
+        exec('\n'.join(lines), namespace)
+        return namespace['_chain']
+
     async def process_item(self, item, spider):
-        return await self._process_chain('process_item', item, spider)
+        return await self._compiled_process_item(item, spider)
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+
 from aioscrapy.db import get_manager
 
 logger = logging.getLogger(__name__)
@@ -43,6 +44,14 @@ class SqlFormat:
 get_sql = SqlFormat()
 
 
+def _make_row_getter(fields):
+    """生成按字段顺序取值的函数: def _row(item): return (item['a'], item['b'],)"""
+    values = ''.join(f'item[{field!r}], ' for field in fields)
+    namespace = {}
+    exec(f'def _row(item): return ({values})', namespace)
+    return namespace['_row']
+
+
 class ItemCache(object):
     def __init__(self, db_type):
         self.db_type = db_type
@@ -51,6 +60,7 @@ class ItemCache(object):
         self.table_cache = {}
         self.insert_sql_cache = {}
         self.db_alias_cache = {}
+        self.getter_cache = {}
 
     def parse_item_to_cache(self, item: dict):
         # 取出要存储的表名
@@ -70,8 +80,8 @@ class ItemCache(object):
             save_db_alias = [save_db_alias]
 
         # 以item的key值更新方式表名做缓存key
-        fields = list(item.keys())
-        cache_key = ''.join(fields + update_fields) + insert_type + table_name
+        fields = tuple(item.keys())
+        cache_key = (fields, tuple(update_fields), insert_type, table_name)
 
         if self.fields_cache.get(cache_key) is None:
             # 缓存要存储的数据库链接别名
@@ -83,6 +93,9 @@ class ItemCache(object):
             # 缓存字段
             self.fields_cache[cache_key] = fields
 
+            # 缓存取值函数, 按字段顺序把item转成一行数据(tuple)
+            self.getter_cache[cache_key] = _make_row_getter(fields)
+
             self.item_cache[cache_key] = []
 
             # 缓存写入的sql语句
@@ -91,16 +104,27 @@ class ItemCache(object):
                                                        insert_type=insert_type)
 
         # 缓存数据
-        self.item_cache[cache_key].append([item[field] for field in self.fields_cache[cache_key]])
+        self.item_cache[cache_key].append(self.getter_cache[cache_key](item))
         return cache_key, len(self.item_cache[cache_key])
 
+    def pop_rows(self, cache_key):
+        # 一条语句换出缓存列表, 中间没有await, 之后的item写入新列表
+        rows, self.item_cache[cache_key] = self.item_cache[cache_key], []
+        return rows
+
 
 class DBPipelineBase:
+    # 子类的_save为_save(self, cache_key, rows)时设为True;
+    # 为False时兼容旧版_save(self, cache_key): 由_save自己读取并清空缓存, 写缓存和落库都在锁内进行
+    save_takes_rows = False
+
     def __init__(self, settings, db_type: str):
         self.cache_num = settings.getint('SAVE_CACHE_NUM', 500)
         self.save_cache_interval = settings.getint('SAVE_CACHE_INTERVAL', 10)
         self.db_type = db_type
         self.save_interval_task = None
+        self._closing = False
+        self._flushing = False
         self.lock = asyncio.Lock()
         self.cache = ItemCache(db_type)
 
@@ -114,49 +138,82 @@ class DBPipelineBase:
         return item
 
     async def close_spider(self, spider):
-        self.save_interval_task and self.save_interval_task.cancel()
+        # 定时任务在sleep时直接取消; 正在落库时等它完成后自行退出, 再做最后一次落库
+        self._closing = True
+        if self.save_interval_task is not None:
+            if not self._flushing:
+                self.save_interval_task.cancel()
+            await asyncio.wait([self.save_interval_task])
         await self.close()
 
     async def close(self, *args, **kwargs):
-        async with self.lock:
-            for cache_key, items in self.cache.item_cache.items():
-                items and await self._save(cache_key)
+        await self.save_all()
 
     async def save_interval(self, interval=10):
-        await asyncio.sleep(interval)
+        while not self._closing:
+            await asyncio.sleep(interval)
+            self._flushing = True
+            try:
+                await self.save_all()
+            finally:
+                self._flushing = False
+
+    async def save_all(self):
+        # 各个表的缓存并发落库, 每个_save各自从连接池取链接
         async with self.lock:
-            for cache_key, items in self.cache.item_cache.items():
-                items and await self._save(cache_key)
-        self.save_interval_task = asyncio.create_task(self.save_interval(interval))
+            cache_keys = [cache_key for cache_key, items in list(self.cache.item_cache.items()) if items]
+            flushes = asyncio.gather(*[self._flush(cache_key) for cache_key in cache_keys],
+                                     return_exceptions=True)
+            # shield: 外部被取消时, 已经从缓存取出的数据仍然会写完, 不会丢失
+            results = await asyncio.shield(flushes)
 
-    async def save_item(self, item: dict):
-        async with self.lock:
-            cache_key, cache_count = self.cache.parse_item_to_cache(item)
-            if cache_count >= self.cache_num:
-                await self._save(cache_key)
+        for cache_key, result in zip(cache_keys, results):
+            if isinstance(result, BaseException):
+                logger.error(f'save data error, table:{self.cache.table_cache[cache_key]}, err_msg:{result}',
+                             exc_info=result)
 
-    async def _save(self, cache_key):
+    async def save_item(self, item: dict):
+        if not self.save_takes_rows:
+            # 旧版_save在落库期间直接读写缓存列表, 写缓存也需要加锁
+            async with self.lock:
+                cache_key, cache_count = self.cache.parse_item_to_cache(item)
+                if cache_count >= self.cache_num:
+                    await self._save(cache_key)
+            return
+
+        # parse_item_to_cache中没有await, 写缓存不需要加锁, 只在落库时加锁
+        cache_key, cache_count = self.cache.parse_item_to_cache(item)
+        if cache_count >= self.cache_num:
+            async with self.lock:
+                await self._flush(cache_key)
+
+    async def _flush(self, cache_key):
+        if not self.save_takes_rows:
+            return await self._save(cache_key)
+        rows = self.cache.pop_rows(cache_key)
+        rows and await self._save(cache_key, rows)
+
+    async def _save(self, cache_key, rows=None):
         raise NotImplementedError
 
 
 class MysqlPipeline(DBPipelineBase):
+    save_takes_rows = True
 
     @classmethod
     def from_settings(cls, settings):
         return cls(settings, 'mysql')
 
-    async def _save(self, cache_key):
+    async def _save(self, cache_key, rows):
         table_name = self.cache.table_cache[cache_key]
-        try:
-            for alias in self.cache.db_alias_cache[cache_key]:
-                async with get_manager(self.db_type).get(alias, ping=True) as (conn, cursor):
-                    try:
-                        num = await cursor.executemany(
-                            self.cache.insert_sql_cache[cache_key], self.cache.item_cache[cache_key])
-                        await conn.commit()
-                        logger.info(f'table:{alias}->{table_name} sum:{len(self.cache.item_cache[cache_key])} ok:{num}')
-                    except Exception as e:
-                        await conn.rollback()
-                        logger.exception(f'save data error, table:{alias}->{table_name}, err_msg:{e}')
-        finally:
-            self.cache.item_cache[cache_key] = []
+        for alias in self.cache.db_alias_cache[cache_key]:
+            async with get_manager(self.db_type).get(alias, ping=True) as (conn, cursor):
+                try:
+                    # aiomysql的executemany会把INSERT ... VALUES (%s,...)改写成一条多行VALUES语句,
+                    # 并按max_stmt_length分批, 所以这里生成的sql必须保持单个VALUES占位符的形式
+                    num = await cursor.executemany(self.cache.insert_sql_cache[cache_key], rows)
+                    await conn.commit()
+                    logger.info(f'table:{alias}->{table_name} sum:{len(rows)} ok:{num}')
+                except Exception as e:
+                    await conn.rollback()
+                    logger.exception(f'save data error, table:{alias}->{table_name}, err_msg:{e}')
@@ -16,6 +16,8 @@ DOWNLOAD_HANDLERS_BASE = {
     'http': 'aioscrapy.core.downloader.handlers.http.AioHttpDownloadHandler',
     'https': 'aioscrapy.core.downloader.handlers.http.AioHttpDownloadHandler',
 }
+# 是否使用aiodns异步解析域名(需要安装aiodns)
+AIOHTTP_ASYNC_RESOLVER = False
 # ===========下载器===================
 
 
@@ -25,16 +25,22 @@ class UrlLengthMiddleware:
         return cls(maxlength)
 
     async def process_spider_output(self, response, result, spider):
+        maxlength = self.maxlength
+        stats = spider.crawler.stats
+
         def _filter(request):
-            if isinstance(request, Request) and len(request.url) > self.maxlength:
+            if isinstance(request, Request) and len(request.url) > maxlength:
                 logger.info(
                     "Ignoring link (url length > %(maxlength)d): %(url)s ",
-                    {'maxlength': self.maxlength, 'url': request.url},
+                    {'maxlength': maxlength, 'url': request.url},
                     extra={'spider': spider}
                 )
-                spider.crawler.stats.inc_value('urllength/request_ignored_count', spider=spider)
+                stats.inc_value('urllength/request_ignored_count', spider=spider)
                 return False
             else:
                 return True
 
-        return (r async for r in result or () if _filter(r))
+        if hasattr(result, '__aiter__'):
+            return (r async for r in result if _filter(r))
+        # 同步的可迭代对象直接用普通生成器过滤, 不需要经过async for
+        return (r for r in result or () if _filter(r))